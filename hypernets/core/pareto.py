@@ -1,5 +1,13 @@
 import numpy as np
 
+from .searcher import OptimizeDirection
+
+
+def direction_signs(directions):
+    """1 for minimization and -1 for maximization, multiply the solutions by it turns all objectives to minimization.
+    """
+    return np.array([1.0 if d in ('min', OptimizeDirection.Minimize) else -1.0 for d in directions])
+
 
 def pareto_dominate(x1, x2, directions=None):
     """dominance in pareto scene, if x1 dominate x2 return True.
@@ -10,27 +18,27 @@ def pareto_dominate(x1, x2, directions=None):
     if not isinstance(x2, np.ndarray):
         x2 = np.array(x2)
 
-    if directions is None:
-        directions = ['min'] * x1.shape[0]
-
-    ret = []
-    for i in range(x1.shape[0]):
-        if directions[i] == 'min':
-            if x1[i] < x2[i]:
-                ret.append(1)
-            elif x1[i] == x2[i]:
-                ret.append(0)
-            else:
-                return False
-        else:
-            if x1[i] > x2[i]:
-                ret.append(1)
-            elif x1[i] == x2[i]:
-                ret.append(0)
-            else:
-                return False
+    if directions is not None:
+        signs = direction_signs(directions)
+        x1 = x1 * signs
+        x2 = x2 * signs
+
+    return bool((x1 <= x2).all() and (x1 < x2).any())
+
+
+def pareto_dominance_matrix(solutions, directions=None):
+    """dominance in pareto scene for every pair of solutions, element (i, j) is True if solution i dominate solution j.
+    """
+    solutions = np.asarray(solutions, dtype=np.float64)
+
+    if directions is not None:
+        # turn to minimization for all objectives
+        solutions = solutions * direction_signs(directions)
+
+    le = (solutions[:, None, :] <= solutions[None, :, :]).all(axis=-1)
+    lt = (solutions[:, None, :] < solutions[None, :, :]).any(axis=-1)
 
-    return np.sum(np.array(ret)) >= 1
+    return le & lt
 
 
 def calc_nondominated_set(solutions: np.ndarray, dominate_func=None, directions=None):
@@ -41,7 +49,10 @@ def calc_nondominated_set(solutions: np.ndarray, dominate_func=None, directions=
         directions = ['min'] * solutions.shape[1]
 
     if dominate_func is None:
-        dominate_func = pareto_dominate
+        # illegal individual for the None scores
+        legal_inx = np.flatnonzero(~(solutions == None).any(axis=1))
+        dominated = pareto_dominance_matrix(solutions[legal_inx], directions=directions).any(axis=0)
+        return [int(i) for i in legal_inx[~dominated]]
 
     def is_pareto_optimal(scores_i):
         if (scores_i == None).any():  # illegal individual for the None scores
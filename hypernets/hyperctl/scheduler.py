@@ -120,17 +120,14 @@ class JobScheduler:
         current_status = job.status
         target_status_file = batch.job_status_file_path(job_name=job.name, status=next_status)
 
-        def touch(f_path):
-            with open(f_path, 'w') as f:
-                pass
-
         if next_status == job.STATUS_INIT:
             raise ValueError(f"can not change to {next_status} ")
         elif next_status == job.STATUS_RUNNING:
             if current_status != job.STATUS_INIT:
                 raise ValueError(f"only job in {job.STATUS_INIT} can change to {next_status}")
 
-            touch(target_status_file)
+            # create the status file, it should not exist for a job in init status
+            os.close(os.open(target_status_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
             job.set_status(next_status)
             reload_status = batch.get_persisted_job_status(job_name=job.name)
             assert reload_status == next_status, f"change job status failed, current status is {reload_status}," \
@@ -140,11 +137,9 @@ class JobScheduler:
             if current_status != job.STATUS_RUNNING:
                 raise ValueError(f"only job in {job.STATUS_RUNNING} can change to "
                                  f"{next_status} but now is {current_status}")
-            # remove running status
-            os.remove(batch.job_status_file_path(job_name=job.name, status=job.STATUS_RUNNING))
+            # replace running status file with the final, atomic on the same file system
+            os.replace(batch.job_status_file_path(job_name=job.name, status=job.STATUS_RUNNING), target_status_file)
 
-            # job.set_status(next_status)
-            touch(target_status_file)
             reload_status = batch.get_persisted_job_status(job_name=job.name)
             assert reload_status == next_status, f"change job status failed, current status is {reload_status}," \
                                                  f" expected status is {next_status}"
@@ -1,10 +1,11 @@
 # -*- encoding: utf-8 -*-
 import json
+import re
 import sys
 from typing import Optional, Awaitable
 
 from tornado.log import app_log
-from tornado.web import RequestHandler, Finish, HTTPError, Application
+from tornado.web import RequestHandler, Finish, HTTPError, Application, url
 
 from hypernets.hyperctl.batch import Batch
 from hypernets.hyperctl.batch import _ShellJob
@@ -14,9 +15,42 @@ from hypernets.hyperctl.utils import http_portal
 from hypernets.utils import logging as hyn_logging
 import copy
 
+try:
+    import orjson
+
+    is_orjson_installed = True
+except ImportError:
+    is_orjson_installed = False
+
 logger = hyn_logging.getLogger(__name__)
 
 
+def _dumps_json(obj, pretty=False):
+    """
+    Serialize obj to a json str, NaN is written as null by orjson for both compact and pretty output.
+    """
+    if is_orjson_installed:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, option=option).decode('utf-8')
+        except TypeError:  # types orjson does not serialize, let json try them
+            pass
+
+    if pretty:
+        return json.dumps(obj, indent=2)
+    else:
+        return json.dumps(obj, separators=(',', ':'))
+
+
+def _loads_json(s):
+    if is_orjson_installed:
+        return orjson.loads(s)
+    else:
+        return json.loads(s)
+
+
 class RestResult(object):
 
     def __init__(self, code, body):
@@ -27,7 +61,7 @@ class RestResult(object):
         return {"code": self.code, "data": self.body}
 
     def to_json(self):
-        return json.dumps(self.to_dict())
+        return _dumps_json(self.to_dict())
 
 
 class RestCode(object):
@@ -37,6 +71,8 @@ class RestCode(object):
 
 class BaseHandler(RequestHandler):
 
+    _request_dict = None  # parsed request body, handler instance is created per request
+
     def data_received(self, chunk: bytes) -> Optional[Awaitable[None]]:
         pass
 
@@ -74,11 +110,15 @@ class BaseHandler(RequestHandler):
 
     def response_json(self, response_dict):
         self.set_header("Content-Type", "application/json")
-        self.write(json.dumps(response_dict, indent=4))
+        if self.get_query_argument('pretty', None) in ('1', 'true'):  # human-readable output
+            self.write(_dumps_json(response_dict, pretty=True))
+        else:
+            self.write(_dumps_json(response_dict))
 
     def get_request_as_dict(self):
-        body = self.request.body
-        return json.loads(body)
+        if self._request_dict is None:
+            self._request_dict = _loads_json(self.request.body)
+        return self._request_dict
 
 
 class IndexHandler(BaseHandler):
@@ -156,12 +196,18 @@ def create_batch_manage_webapp(server_host, server_port, batch, job_scheduler) -
     return application
 
 
+# compiled once and shared by all applications
+_ROUTE_JOB_OPERATION = re.compile(r'/hyperctl/api/job/(?P<job_name>.+)/(?P<operation>.+)$')
+_ROUTE_JOB = re.compile(r'/hyperctl/api/job/(?P<job_name>.+)$')
+_ROUTE_JOB_LIST = re.compile(r'/hyperctl/api/job$')
+_ROUTE_INDEX = re.compile(r'/hyperctl$')
+
+
 def create_hyperctl_handlers(batch, job_scheduler):
     handlers = [
-        (r'/hyperctl/api/job/(?P<job_name>.+)/(?P<operation>.+)',
-         JobOperationHandler, dict(batch=batch, job_scheduler=job_scheduler)),
-        (r'/hyperctl/api/job/(?P<job_name>.+)', JobHandler, dict(batch=batch)),
-        (r'/hyperctl/api/job', JobListHandler, dict(batch=batch)),
-        (r'/hyperctl', IndexHandler)
+        url(_ROUTE_JOB_OPERATION, JobOperationHandler, dict(batch=batch, job_scheduler=job_scheduler)),
+        url(_ROUTE_JOB, JobHandler, dict(batch=batch)),
+        url(_ROUTE_JOB_LIST, JobListHandler, dict(batch=batch)),
+        url(_ROUTE_INDEX, IndexHandler)
     ]
     return handlers
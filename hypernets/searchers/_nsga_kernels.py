@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def _peel_fronts_numpy(dominance_matrix: np.ndarray):
+    n = dominance_matrix.shape[0]
+    ranks = np.full(n, -1, dtype=np.int32)
+    n_dominated = dominance_matrix.sum(axis=0).astype(np.int64)
+
+    front = np.flatnonzero(n_dominated == 0)
+    rank = 0
+    while len(front) > 0:
+        ranks[front] = rank
+        # remove the front and count again for the rest individuals
+        n_dominated = n_dominated - dominance_matrix[front].sum(axis=0)
+        n_dominated[ranks >= 0] = -1
+        front = np.flatnonzero(n_dominated == 0)
+        rank = rank + 1
+
+    return ranks
+
+
+def _peel_fronts_loop(dominance_matrix: np.ndarray):
+    n = dominance_matrix.shape[0]
+    ranks = np.full(n, -1, dtype=np.int32)
+    n_dominated = np.zeros(n, dtype=np.int64)
+    for p in range(n):
+        for q in range(n):
+            if dominance_matrix[p, q]:
+                n_dominated[q] += 1
+
+    front = np.empty(n, dtype=np.int64)
+    n_front = 0
+    for p in range(n):
+        if n_dominated[p] == 0:
+            ranks[p] = 0
+            front[n_front] = p
+            n_front += 1
+
+    next_front = np.empty(n, dtype=np.int64)
+    rank = 0
+    while n_front > 0:
+        n_next_front = 0
+        for k in range(n_front):
+            p = front[k]
+            for q in range(n):
+                if dominance_matrix[p, q]:
+                    n_dominated[q] -= 1
+                    if n_dominated[q] == 0:
+                        ranks[q] = rank + 1
+                        next_front[n_next_front] = q
+                        n_next_front += 1
+        front, next_front = next_front, front
+        n_front = n_next_front
+        rank += 1
+
+    return ranks
+
+
+_peel_fronts = None
+
+
+def _get_peel_fronts():
+    # numba is imported on the first call only, it is slow to import
+    global _peel_fronts
+
+    if _peel_fronts is None:
+        try:
+            from numba import njit
+            loop = njit(cache=True)(_peel_fronts_loop)
+            _peel_fronts = lambda m: loop(np.ascontiguousarray(m, dtype=np.bool_))
+        except ImportError:
+            _peel_fronts = _peel_fronts_numpy
+    return _peel_fronts
+
+
+def peel_fronts(dominance_matrix: np.ndarray):
+    """rank of every individual given the dominance matrix, element (i, j) of which is True if individual i
+    dominate individual j. Ranks start from 0, the individuals not belong to any front are -1.
+    """
+    return _get_peel_fronts()(dominance_matrix)
@@ -9,7 +9,7 @@ from hypernets.core import pareto
 
 from .genetic import Individual, ShuffleCrossOver, SinglePointCrossOver, UniformCrossover, SinglePointMutation, \
     create_recombination
-from .moo import MOOSearcher
+from .moo import MOOSearcher, _get_plt
 from ..utils import const
 
 
@@ -308,9 +308,7 @@ class MOEADSearcher(MOOSearcher):
         return [population[i] for i in non_dominated_inx]
 
     def _plot_population(self, figsize=(6, 6), **kwargs):
-        from matplotlib import pyplot as plt
-
-        figs, axes = plt.subplots(1, 2, figsize=(figsize[0] * 2, figsize[1]))
+        figs, axes = _get_plt().subplots(1, 2, figsize=(figsize[0] * 2, figsize[1]))
         historical_individuals = self.get_historical_population()
 
         # 1. population plot
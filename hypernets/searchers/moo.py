@@ -10,6 +10,18 @@ from hypernets.searchers.genetic import Individual
 from hypernets.utils import const
 
 
+_plt = None
+
+
+def _get_plt():
+    """import matplotlib.pyplot lazily and only once"""
+    global _plt
+    if _plt is None:
+        from matplotlib import pyplot as plt
+        _plt = plt
+    return _plt
+
+
 def _compair(x1, x2, c_op):
 
     x1 = np.array(x1)
@@ -66,7 +78,8 @@ class MOOSearcher(Searcher, metaclass=abc.ABCMeta):
     def _plot_pareto(self, ax, historical_individuals):
         # pareto dominated plot
         pn_set = self.get_pareto_nondominated_set()
-        pd_set: List[Individual] = list(filter(lambda v: v not in pn_set, historical_individuals))
+        pn_set_ids = {id(_) for _ in pn_set}
+        pd_set: List[Individual] = list(filter(lambda v: id(v) not in pn_set_ids, historical_individuals))
         self._do_plot(pn_set, color='red', label='non-dominated', ax=ax, marker="o")  # , marker="o"
         self._do_plot(pd_set, color='blue', label='dominated', ax=ax, marker="o")
         ax.set_title(f"non-dominated solution (total={len(historical_individuals)}) in pareto scene")
@@ -77,7 +90,9 @@ class MOOSearcher(Searcher, metaclass=abc.ABCMeta):
 
     def _sub_plot_pop(self, ax, historical_individuals):
         population = self.get_population()
-        not_in_population: List[Individual] = list(filter(lambda v: v not in population, historical_individuals))
+        population_ids = {id(_) for _ in population}
+        not_in_population: List[Individual] = list(filter(lambda v: id(v) not in population_ids,
+                                                          historical_individuals))
         self._do_plot(population, color='red', label='in-population', ax=ax, marker="o")  #
         self._do_plot(not_in_population, color='blue', label='others', ax=ax, marker="o")  # marker="p"
         ax.set_title(f"individual in population(total={len(historical_individuals)}) plot")
@@ -100,7 +115,7 @@ class MOOSearcher(Searcher, metaclass=abc.ABCMeta):
 
     def check_plot(self):
         try:
-            from matplotlib import pyplot as plt
+            _get_plt()
         except Exception:
             raise RuntimeError("it requires matplotlib installed.")
 
@@ -1,17 +1,27 @@
-from typing import List
-from functools import cmp_to_key
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
 
 import numpy as np
 
 from hypernets.utils import logging as hyn_logging, const
-from ..core.pareto import pareto_dominate
+from ..core.pareto import pareto_dominate, pareto_dominance_matrix, direction_signs
 from ..core import HyperSpace, get_random_state
 
-from .moo import MOOSearcher
+from .moo import MOOSearcher, _get_plt
+from ._nsga_kernels import peel_fronts
 from .genetic import Individual, SinglePointMutation, _Survival, create_recombination
 
 logger = hyn_logging.get_logger(__name__)
 
+_analysis_executor: Optional[ThreadPoolExecutor] = None  # shared by searchers, keeps them picklable
+
+
+def _get_analysis_executor():
+    global _analysis_executor
+    if _analysis_executor is None:
+        _analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nsga-analysis')
+    return _analysis_executor
+
 
 class _NSGAIndividual(Individual):
     def __init__(self, dna: HyperSpace, scores: np.ndarray, random_state):
@@ -30,6 +40,15 @@ class _NSGAIndividual(Individual):
 
         self.distance: float = -1.0  # crowding-distance
 
+    @property
+    def scores(self):
+        return self._scores
+
+    @scores.setter
+    def scores(self, scores):
+        self._scores = scores
+        self.scores_arr = np.ascontiguousarray(scores, dtype=np.float64)  # cached for vectorized computing
+
     def reset(self):
         self.rank = -1
         self.S = []
@@ -42,6 +61,32 @@ class _NSGAIndividual(Individual):
                f"rank={self.rank}, n={self.n}, distance={self.distance})"
 
 
+def _get_scores_array(population: List[Individual]):
+    """stack scores of individuals into an array in shape (n_individuals, n_objectives)"""
+    if len(population) == 0:
+        return np.empty((0, 0), dtype=np.float64)
+
+    def get_scores(indi):
+        if isinstance(indi, _NSGAIndividual):
+            return indi.scores_arr
+        else:
+            return np.asarray(indi.scores, dtype=np.float64)
+
+    # fill rows of a preallocated buffer rather than copying from a temporary list of arrays
+    n_objectives = get_scores(population[0]).shape[0]
+    scores = np.empty((len(population), n_objectives), dtype=np.float64)
+    for i, indi in enumerate(population):
+        scores[i] = get_scores(indi)
+    return scores
+
+
+def _get_ranks_and_distances(population: List[_NSGAIndividual]):
+    n = len(population)
+    ranks = np.fromiter((indi.rank for indi in population), dtype=np.int64, count=n)
+    distances = np.fromiter((indi.distance for indi in population), dtype=np.float64, count=n)
+    return ranks, distances
+
+
 class _RankAndCrowdSortSurvival(_Survival):
 
     def __init__(self, directions, population_size, random_state):
@@ -49,71 +94,62 @@ class _RankAndCrowdSortSurvival(_Survival):
         self.population_size = population_size
         self.random_state = random_state
 
+        self._direction_signs = direction_signs(directions)
+
     @staticmethod
     def crowding_distance_assignment(I: List[_NSGAIndividual]):
-        scores_array = np.array([indi.scores for indi in I])
-
-        maximum_array = np.max(scores_array, axis=0)
-        minimum_array = np.min(scores_array, axis=0)
-
-        for m in range(len(I[0].scores)):
-            sorted_I = list(sorted(I, key=lambda v: v.scores[m], reverse=False))
-            sorted_I[0].distance = float("inf")  # so that boundary points always selected, because they are not crowd
-            sorted_I[len(I) - 1].distance = float("inf")
+        scores_array = _get_scores_array(I)
+        n_individuals, n_objectives = scores_array.shape
+        distances = np.zeros(n_individuals)
+
+        for m in range(n_objectives):
+            sorted_inx = np.argsort(scores_array[:, m], kind='stable')
+            # so that boundary points always selected, because they are not crowd
+            distances[sorted_inx[0]] = distances[sorted_inx[-1]] = np.inf
+            scores_extend = scores_array[sorted_inx[-1], m] - scores_array[sorted_inx[0], m]
+            if scores_extend == 0:
+                continue
             # only assign distances for non-boundary points
-            for i in range(len(I) - 2):
-                ti = i + 1
-                sorted_I[ti].distance = sorted_I[ti].distance \
-                                        + (sorted_I[ti + 1].scores[m] - sorted_I[ti - 1].scores[m]) \
-                                        / (maximum_array[m] - minimum_array[m])
+            distances[sorted_inx[1:-1]] += \
+                (scores_array[sorted_inx[2:], m] - scores_array[sorted_inx[:-2], m]) / scores_extend
+
+        for indi, distance in zip(I, distances):
+            indi.distance = float(distance)
         return I
 
     def fast_non_dominated_sort(self, pop: List[_NSGAIndividual]):
+        return self._sort_fronts(pop, self.calc_dominance_matrix(pop))
+
+    @staticmethod
+    def _sort_fronts(pop: List[_NSGAIndividual], dominance_matrix: np.ndarray):
         for p in pop:
             p.reset()
-        F_1 = []
-        F = [F_1]  # to store pareto front of levels respectively
-        for p in pop:
-            p.n = 0
-            for q in pop:
-                if p == q:
-                    continue
-                if self.dominate(p, q, pop=pop):
-                    p.S.append(q)
-                if self.dominate(q, p, pop=pop):
-                    p.T.append(q)
-                    p.n = p.n + 1
-
-            if p.n == 0:
-                p.rank = 0
-                F_1.append(p)
-
-        i = 0
-        while True:
-            Q = []
-            for p in F[i]:
-                for q in p.S:
-                    q.n = q.n - 1
-                    if q.n == 0:
-                        q.rank = i + 1
-                        Q.append(q)
-            if len(Q) == 0:
-                break
-            F.append(Q)
-            i = i + 1
+
+        n_dominated = dominance_matrix.sum(axis=0)
+        ranks = peel_fronts(dominance_matrix)
+        # S and T are left empty by reset(), the dominance matrix holds them
+        for p, n, rank in zip(pop, n_dominated.tolist(), ranks.tolist()):
+            p.n = n
+            p.rank = rank
+
+        # to store pareto front of levels respectively
+        n_fronts = max(int(ranks.max(initial=-1)) + 1, 1)
+        F = [[pop[i] for i in np.flatnonzero(ranks == rank)] for rank in range(n_fronts)]
         return F
 
     def sort_font(self, front: List[_NSGAIndividual]):
         return self.crowding_distance_assignment(front)
 
     def sort_population(self, population: List[_NSGAIndividual]):
-        return sorted(population, key=self.cmp_operator, reverse=False)
+        ranks, distances = _get_ranks_and_distances(population)
+        # the smaller the rank the better, the larger the distance the better
+        return [population[i] for i in np.lexsort((-distances, ranks))]
 
     def update(self, pop: List[_NSGAIndividual], challengers: List[Individual]):
         temp_pop = []
         temp_pop.extend(pop)
         temp_pop.extend(challengers)
-        if len(pop) < self.population_size:
+        if len(temp_pop) <= self.population_size:  # no one need to be removed
             return temp_pop
 
         # assign a weighted Euclidean distance for each one
@@ -132,7 +168,7 @@ class _RankAndCrowdSortSurvival(_Survival):
                 break
 
         # ensure population size
-        p_cmp_sorted = list(sorted(p_selected, key=cmp_to_key(self.cmp_operator), reverse=True))
+        p_cmp_sorted = self.sort_population(p_selected)
         p_final = p_cmp_sorted[:self.population_size]
         logger.debug(f"Individual {p_cmp_sorted[self.population_size-1: ]} have been removed from population,"
                      f" sorted population ={p_cmp_sorted}")
@@ -140,35 +176,54 @@ class _RankAndCrowdSortSurvival(_Survival):
         return p_final
 
     def dominate(self, ind1: _NSGAIndividual, ind2: _NSGAIndividual, pop: List[_NSGAIndividual]):
-        return pareto_dominate(x1=ind1.scores, x2=ind2.scores, directions=self.directions)
+        x1, x2 = _get_scores_array([ind1, ind2]) * self._direction_signs
+        return pareto_dominate(x1=x1, x2=x2)
+
+    def calc_dominance_matrix(self, pop: List[_NSGAIndividual]):
+        """element (i, j) is True if pop[i] dominate pop[j]"""
+        return pareto_dominance_matrix(_get_scores_array(pop) * self._direction_signs)
 
     @staticmethod
     def cmp_operator(s1: _NSGAIndividual, s2: _NSGAIndividual):
-        if s1.rank < s2.rank:
-            return 1
-        elif s1.rank == s2.rank:
-            if s1.distance > s2.distance:  # the larger the distance the better
-                return 1
-            elif s1.distance == s2.distance:
-                return 0
-            else:
-                return -1
-        else:
-            return -1
+        # the smaller the rank the better, then the larger the distance the better
+        return (int(s1.rank < s2.rank) - int(s1.rank > s2.rank)) or \
+               (int(s1.distance > s2.distance) - int(s1.distance < s2.distance))
 
     def calc_nondominated_set(self, population: List[_NSGAIndividual]):
-        def find_non_dominated_solu(indi):
-            if (np.array(indi.scores) == None).any():  # illegal individual for the None scores
-                return False
-            for indi_ in population:
-                if indi_ == indi:
-                    continue
-                if self.dominate(ind1=indi_, ind2=indi, pop=population):
-                    return False
-            return True  # this is a pareto optimal
+        if len(population) == 0:
+            return []
+
+        # illegal individual for the None scores
+        scores = _get_scores_array(population)
+        legal_population = [indi for indi, legal in zip(population, ~np.isnan(scores).any(axis=1)) if legal]
+        if len(legal_population) == 0:
+            return []
 
         # find non-dominated solution for every solution
-        ns = list(filter(lambda s: find_non_dominated_solu(s), population))
+        dominated = self.calc_dominance_matrix(legal_population).any(axis=0)
+        ns = [indi for indi, d in zip(legal_population, dominated) if not d]
+
+        return ns
+
+    def update_nondominated_set(self, nondominated_set: List[_NSGAIndividual], challengers: List[Individual]):
+        """non-dominated set after adding challengers to the population whose non-dominated set is given.
+        return None if it can not be updated incrementally.
+        """
+        # pareto dominance is transitive, so that any dominated individual is dominated by the non-dominated set
+        ns = list(nondominated_set)
+        front = _get_scores_array(ns) * self._direction_signs if len(ns) > 0 else None
+        for challenger in challengers:
+            x = _get_scores_array([challenger])[0] * self._direction_signs
+            if np.isnan(x).any():  # illegal individual for the None scores
+                continue
+            if front is None:
+                ns, front = [challenger], x[None, :]
+                continue
+            if ((front <= x).all(axis=1) & (front < x).any(axis=1)).any():  # dominated by a member
+                continue
+            survived = ~((x <= front).all(axis=1) & (x < front).any(axis=1))
+            ns = [indi for indi, s in zip(ns, survived) if s] + [challenger]
+            front = np.vstack([front[survived], x])
 
         return ns
 
@@ -193,32 +248,24 @@ class _NSGAIIBasedSearcher(MOOSearcher):
         self.survival = survival
 
         self._historical_individuals: List[_NSGAIndividual] = []
+        self._nondominated_set: Optional[List[_NSGAIndividual]] = None  # cache of non-dominated set of history
 
     def binary_tournament_select(self, population):
-        indi_inx = self.random_state.randint(low=0, high=len(population) - 1, size=2)  # fixme: maybe duplicated inx
+        # pick 2 distinct pairs of competitors, fallback to replacement if the population is too small
+        n = len(population)
+        indi_inx = self.random_state.choice(n, size=4, replace=n < 4)
 
-        p1 = population[indi_inx[0]]
-        p2 = population[indi_inx[1]]
+        def select(inx1, inx2):
+            if self.survival.cmp_operator(population[inx1], population[inx2]) >= 0:
+                return inx1
+            else:
+                return inx2
 
         # select the first parent
-        if self.survival.cmp_operator(p1, p2) >= 0:
-            first_inx = indi_inx[0]
-        else:
-            first_inx = indi_inx[1]
+        first_inx = select(indi_inx[0], indi_inx[1])
 
         # select the second parent
-        indi_inx = self.random_state.randint(low=0, high=len(population) - 1, size=2)
-        try_times = 0
-        while first_inx in indi_inx:  # exclude the first individual
-            if try_times > 10000:
-                raise RuntimeError("too many times for selecting individual to mat. ")
-            indi_inx = self.random_state.randint(low=0, high=len(population) - 1, size=2)
-            try_times = try_times + 1
-
-        if self.survival.cmp_operator(p1, p2) >= 0:
-            second_inx = indi_inx[0]
-        else:
-            second_inx = indi_inx[1]
+        second_inx = select(indi_inx[2], indi_inx[3])
 
         return population[first_inx], population[second_inx]
 
@@ -250,21 +297,62 @@ class _NSGAIIBasedSearcher(MOOSearcher):
     def update_result(self, space, result):
         indi = _NSGAIndividual(space, result, self.random_state)
         self._historical_individuals.append(indi)  # add to history
+        self._update_nondominated_set([indi])
         p = self.survival.update(pop=self.population,  challengers=[indi])
         self.population = p
 
         challengers = [indi]
 
-        if challengers[0] in self.population:
+        if id(challengers[0]) in {id(_) for _ in self.population}:
             logger.debug(f"new individual{challengers} is accepted by population, current population {self.population}")
         else:
             logger.debug(f"new individual{challengers[0]} is not accepted by population, "
                          f"current population {self.population}")
 
+    def sample_batch(self, n_samples, space_options=None):
+        """Sample `n_samples` offspring from the current population without updating it, so that they can be
+        evaluated concurrently and then be fed back in one step with `update_result_batch`, for example:
+
+            spaces = searcher.sample_batch(4)
+            with ProcessPoolExecutor() as executor:
+                results = list(executor.map(objective, spaces))
+            searcher.update_result_batch(spaces, results)
+        """
+        return [self.sample(space_options=space_options) for _ in range(n_samples)]
+
+    def update_result_batch(self, spaces, results):
+        """Update the population with the results of a batch of samples in one survival selection.
+        """
+        challengers = [_NSGAIndividual(space, result, self.random_state) for space, result in zip(spaces, results)]
+        self._historical_individuals.extend(challengers)  # add to history
+        self._update_nondominated_set(challengers)
+        self.population = self.survival.update(pop=self.population, challengers=challengers)
+
+        population_ids = {id(_) for _ in self.population}
+        n_accepted = len([indi for indi in challengers if id(indi) in population_ids])
+        logger.debug(f"{n_accepted} of {len(challengers)} new individuals are accepted by population, "
+                     f"current population {self.population}")
+
+    def _update_nondominated_set(self, challengers):
+        if self._nondominated_set is not None:
+            self._nondominated_set = self.survival.update_nondominated_set(self._nondominated_set, challengers)
+
     def get_nondominated_set(self):
-        population = self.get_historical_population()
-        ns = self.survival.calc_nondominated_set(population)
-        return ns
+        if self._nondominated_set is None:
+            population = self.get_historical_population()
+            self._nondominated_set = self.survival.calc_nondominated_set(population)
+        return list(self._nondominated_set)
+
+    def get_nondominated_set_async(self) -> Future:
+        """Calculate the non-dominated set of the current history in a background thread so that monitoring does
+        not block the search, returns a `concurrent.futures.Future` of it.
+        """
+        if self._nondominated_set is not None:
+            future = Future()
+            future.set_result(list(self._nondominated_set))
+            return future
+        population = list(self.get_historical_population())  # snapshot the history
+        return _get_analysis_executor().submit(self.survival.calc_nondominated_set, population)
 
     def get_historical_population(self):
         return self._historical_individuals
@@ -277,14 +365,14 @@ class _NSGAIIBasedSearcher(MOOSearcher):
         colors = ['c', 'm', 'y', 'r', 'g']
         n_colors = len(colors)
         for i, front in enumerate(p_sorted[: n_colors]):
-            scores = np.array([_.scores for _ in front])
+            scores = _get_scores_array(front)
             ax.scatter(scores[:, 0], scores[:, 1], color=colors[i], label=f"rank={i + 1}")
 
         if len(p_sorted) > n_colors:
             others = []
             for front in p_sorted[n_colors:]:
                 others.extend(front)
-            scores = np.array([_.scores for _ in others])
+            scores = _get_scores_array(others)
             ax.scatter(scores[:, 0], scores[:, 1], color='b', label='others')
         ax.set_title(f"individuals(total={len(historical_individuals)}) ranking plot")
         objective_names = [_.name for _ in self.objectives]
@@ -293,9 +381,7 @@ class _NSGAIIBasedSearcher(MOOSearcher):
         ax.legend()
 
     def _plot_population(self, figsize=(6, 6), **kwargs):
-        from matplotlib import pyplot as plt
-
-        figs, axes = plt.subplots(3, 1, figsize=(figsize[0], figsize[0] * 3))
+        figs, axes = _get_plt().subplots(3, 1, figsize=(figsize[0], figsize[0] * 3))
         historical_individuals = self.get_historical_population()
 
         # 1. ranking plot
@@ -385,46 +471,76 @@ class _RDominanceSurvival(_RankAndCrowdSortSurvival):
 
     def dominate(self, ind1: _NSGAIndividual, ind2: _NSGAIndividual, pop: List[_NSGAIndividual], directions=None):
 
+        x1, x2 = _get_scores_array([ind1, ind2])
+
         # check pareto dominate
-        if pareto_dominate(ind1.scores, ind2.scores, directions=directions):
+        if pareto_dominate(x1, x2, directions=directions):
             return True
 
-        if pareto_dominate(ind2.scores, ind1.scores, directions=directions):
+        if pareto_dominate(x2, x1, directions=directions):
             return False
 
         # in case of pareto-equivalent, compare distance
-        scores = np.array([_.scores for _ in pop])
-        scores_extend = np.max(scores, axis=0) - np.min(scores, axis=0)
-        distances = []
-        for indi in pop:
-            # Calculate weighted Euclidean distance of two solution.
-            # Note: if ref_point is infeasible value, distance maybe larger than 1
-            indi.distance = np.sqrt(np.sum(np.square((np.asarray(indi.scores) - self.ref_point) / scores_extend) * self.weights))
-            distances.append(indi.distance)
+        distances = self.calc_distances(_get_scores_array(pop))
+        for indi, distance in zip(pop, distances):
+            indi.distance = distance
 
         dist_extent = np.max(distances) - np.min(distances)
 
         return (ind1.distance - ind2.distance) / dist_extent < -self.threshold
 
+    def calc_distances(self, scores: np.ndarray):
+        # Calculate weighted Euclidean distance of two solution.
+        # Note: if ref_point is infeasible value, distance maybe larger than 1
+        scores_extend = np.max(scores, axis=0) - np.min(scores, axis=0)
+        return np.sqrt(np.sum(np.square((scores - self.ref_point) / scores_extend) * self.weights, axis=1))
+
+    def calc_dominance_matrix(self, pop: List[_NSGAIndividual]):
+        scores = _get_scores_array(pop)
+        if len(pop) == 0:
+            return pareto_dominance_matrix(scores)
+        return self._calc_dominance_matrix(scores, self.calc_distances(scores))
+
+    def _calc_dominance_matrix(self, scores: np.ndarray, distances: np.ndarray):
+        pareto_dominance = pareto_dominance_matrix(scores)
+
+        # in case of pareto-equivalent, compare distance
+        dist_extent = np.max(distances) - np.min(distances)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance_dominance = (distances[:, None] - distances[None, :]) / dist_extent < -self.threshold
+        pareto_equivalent = ~(pareto_dominance | pareto_dominance.T)
+
+        return pareto_dominance | (pareto_equivalent & distance_dominance)
+
+    def fast_non_dominated_sort(self, pop: List[_NSGAIndividual]):
+        if len(pop) == 0:
+            return super(_RDominanceSurvival, self).fast_non_dominated_sort(pop)
+
+        scores = _get_scores_array(pop)
+        distances = self.calc_distances(scores)
+        F = self._sort_fronts(pop, self._calc_dominance_matrix(scores, distances))
+        # assign a weighted Euclidean distance for each one
+        for indi, distance in zip(pop, distances):
+            indi.distance = distance
+        return F
+
+    def update_nondominated_set(self, nondominated_set: List[_NSGAIndividual], challengers: List[Individual]):
+        # r-dominance depends on the distances over the whole population, have to calculate from scratch
+        return None
+
     def sort_font(self, front: List[_NSGAIndividual]):
         return sorted(front, key=lambda v: v.distance, reverse=False)
 
     def sort_population(self, population: List[_NSGAIndividual]):
-        return sorted(population, key=cmp_to_key(self.cmp_operator), reverse=True)
+        ranks, distances = _get_ranks_and_distances(population)
+        # the smaller the rank the better, the smaller the distance the better
+        return [population[i] for i in np.lexsort((distances, ranks))]
 
     @staticmethod
     def cmp_operator(s1: _NSGAIndividual, s2: _NSGAIndividual):
-        if s1.rank < s2.rank:
-            return 1
-        elif s1.rank == s2.rank:
-            if s1.distance < s2.distance:  # the smaller the distance the better
-                return 1
-            elif s1.distance == s2.distance:
-                return 0
-            else:
-                return -1
-        else:
-            return -1
+        # the smaller the rank the better, then the smaller the distance the better
+        return (int(s1.rank < s2.rank) - int(s1.rank > s2.rank)) or \
+               (int(s1.distance < s2.distance) - int(s1.distance > s2.distance))
 
     def __repr__(self):
         return f"{self.__class__.__name__}(ref_point={self.ref_point}, weights={self.weights}, " \
@@ -499,8 +615,6 @@ class RNSGAIISearcher(_NSGAIIBasedSearcher):
                                               random_state=random_state)
 
     def _plot_population(self, figsize=(6, 6), show_ref_point=True, show_weights=False, **kwargs):
-        from matplotlib import pyplot as plt
-
         def attach(ax):
             if show_ref_point:
                 ref_point = self.survival.ref_point
@@ -510,7 +624,7 @@ class RNSGAIISearcher(_NSGAIIBasedSearcher):
                 # plot a vector
                 ax.quiver(0, 0, weights[0], weights[1], angles='xy', scale_units='xy', label='weights')
 
-        figs, axes = plt.subplots(2, 2, figsize=(figsize[0] * 2, figsize[0] * 2))
+        figs, axes = _get_plt().subplots(2, 2, figsize=(figsize[0] * 2, figsize[0] * 2))
         historical_individuals = self.get_historical_population()
 
         # 1. ranking plot
@@ -526,7 +640,8 @@ class RNSGAIISearcher(_NSGAIIBasedSearcher):
         # 3. r-dominated plot
         ax3 = axes[1][0]
         n_set = self.get_nondominated_set()
-        d_set: List[Individual] = list(filter(lambda v: v not in n_set, historical_individuals))
+        n_set_ids = {id(_) for _ in n_set}
+        d_set: List[Individual] = list(filter(lambda v: id(v) not in n_set_ids, historical_individuals))
         self._do_plot(n_set, color='red', label='non-dominated', ax=ax3, marker="o")  # , marker="o"
         self._do_plot(d_set, color='blue', label='dominated', ax=ax3, marker="o")
         ax3.set_title(f"non-dominated solution (total={len(historical_individuals)}) in R-dominance scene")
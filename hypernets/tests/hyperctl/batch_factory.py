@@ -1,7 +1,6 @@
 import os
 import sys
 import tempfile
-from pathlib import Path
 
 from hypernets.hyperctl.batch import Batch
 from hypernets.tests.utils import ssh_utils_test
@@ -56,8 +55,6 @@ def create_assert_env_batch():
     py_code = f"import os; ch=os.environ['hyn_test_conda_home']; print(ch); assert ch == '/home/hyperctl/miniconda3' "
     batch = Batch(name="assert_env_batch", data_dir=os.path.join(batches_data_dir, "assert_env_batch"), job_command=f"{sys.executable} -c \"{py_code}\"")
 
-    job1_data_dir = (batch.data_dir_path / job1_name).absolute().as_posix()
-
     batch.add_job(name=job1_name,
                   params={"learning_rate": 0.1})
 
@@ -72,8 +69,6 @@ def create_assets_batch(data_dir):
     command = f"cat resources/{data_dir.name}/sub_dir/b.txt" # read files in remote
     batch = Batch(name=batch_name, data_dir=batches_data_dir, job_command=command)
 
-    job1_data_dir_path = (batch.data_dir_path / job1_name).absolute()
-    job1_data_dir = job1_data_dir_path.as_posix()
     job_asserts = [data_dir.as_posix()]
 
     batch.add_job(name=job1_name,
@@ -1,9 +1,13 @@
+import json
 import tempfile
 from pathlib import Path
 
+import numpy as np
+
 from hypernets.hyperctl.appliation import BatchApplication
 from hypernets.hyperctl.batch import _ShellJob
 from hypernets.hyperctl.executor import LocalExecutorManager, RemoteSSHExecutorManager
+from hypernets.hyperctl.server import RestResult, RestCode
 from hypernets.tests.hyperctl.batch_factory import create_minimum_batch, create_local_batch
 
 
@@ -57,3 +61,12 @@ def test_get_job_by_name():
     assert job.name == req_job_name
     assert batch.get_persisted_job_status(req_job_name) == _ShellJob.STATUS_INIT
     assert job.params['learning_rate'] == 0.2
+
+
+def test_job_to_json():
+    batch = create_minimum_batch()
+    batch.add_job(name='job2', params={'learning_rate': np.float64(0.05)})
+
+    result = RestResult(RestCode.Success, batch.get_job_by_name('job2').to_dict()).to_json()
+    assert isinstance(result, str)
+    assert json.loads(result)['data']['params'] == {'learning_rate': 0.05}
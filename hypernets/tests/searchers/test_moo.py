@@ -1,6 +1,6 @@
 import numpy as np
 
-from hypernets.core.pareto import pareto_dominate
+from hypernets.core.pareto import pareto_dominate, pareto_dominance_matrix
 from hypernets.searchers.genetic import Individual
 
 
@@ -19,3 +19,13 @@ def test_dominate():
     s5 = np.array([0.8, 100])
     s6 = np.array([0.7, 101])
     assert pareto_dominate(s5, s6, directions=('max', 'min'))
+
+
+def test_dominance_matrix():
+    scores = np.array([[0.5, 0.6], [0.4, 0.6], [0.3, 0.7], [0.2, 0.5]])
+    directions = ('min', 'max')
+    dominance_matrix = pareto_dominance_matrix(scores, directions=directions)
+
+    for i, s_i in enumerate(scores):
+        for j, s_j in enumerate(scores):
+            assert dominance_matrix[i, j] == pareto_dominate(s_i, s_j, directions=directions)
@@ -9,11 +9,13 @@ from hypernets.searchers.nsga_searcher import NSGAIISearcher, _NSGAIndividual, _
 from sklearn.preprocessing import LabelEncoder
 from hypernets.core.random_state import set_random_state, get_random_state
 from hypernets.examples.plain_model import PlainSearchSpace, PlainModel
+from hypernets.examples.smoke_testing import get_space
 from hypernets.tabular.datasets import dsutils
 from hypernets.tabular.sklearn_ex import MultiLabelEncoder
 from sklearn.model_selection import train_test_split
 
 from hypernets.searchers.genetic import Individual, create_recombination
+from hypernets.searchers import _nsga_kernels
 from hypernets.utils import const
 
 
@@ -76,6 +78,31 @@ class TestRankAndCrowdSortSurvival:
         assert len(l) == 3
         assert l[2][0] == i4
 
+    def test_peel_fronts(self):
+        dominance_matrix = np.array([[False, True, True, True],
+                                     [False, False, False, True],
+                                     [False, False, False, False],
+                                     [False, False, False, False]])
+
+        ranks = _nsga_kernels.peel_fronts(dominance_matrix)
+        assert ranks.tolist() == [0, 1, 1, 2]
+
+        # compiled routine and numpy routine get the same ranks
+        assert _nsga_kernels._peel_fronts_numpy(dominance_matrix).tolist() == ranks.tolist()
+        assert _nsga_kernels._peel_fronts_loop(dominance_matrix).tolist() == ranks.tolist()
+
+    def test_update_nondominated_set(self):
+        survival = self.survival
+        i1 = _NSGAIndividual("1", np.array([0.1, 0.3]), None)
+        i2 = _NSGAIndividual("2", np.array([0.3, 0.1]), None)
+        i3 = _NSGAIndividual("3", np.array([0.2, 0.4]), None)  # dominated by i1
+        i4 = _NSGAIndividual("4", np.array([0.05, 0.2]), None)  # dominates i1
+        i5 = _NSGAIndividual("5", np.array([np.nan, 0.1]), None)  # illegal
+
+        assert survival.update_nondominated_set([], [i1, i2]) == [i1, i2]
+        assert survival.update_nondominated_set([i1, i2], [i3, i5]) == [i1, i2]
+        assert survival.update_nondominated_set([i1, i2], [i4]) == [i2, i4]
+
     def test_non_dominated(self):
         survival = self.survival
         i1 = Individual("1", np.array([0.1, 0.2]), None)
@@ -132,6 +159,36 @@ class TestNSGA2:
         ns = rs.get_nondominated_set()
         assert ns
 
+    def test_batch(self):
+        random_state = np.random.RandomState(1234)
+        rs = NSGAIISearcher(get_space, objectives=[ElapsedObjective(), create_objective('nf')],
+                            population_size=5, random_state=random_state)
+        for _ in range(4):
+            spaces = rs.sample_batch(3)
+            assert len(spaces) == 3
+            assert all(space.all_assigned for space in spaces)
+            rs.update_result_batch(spaces, [random_state.uniform(size=2) for _ in spaces])
+            assert len(rs.get_population()) <= 5
+            # non-dominated set is updated incrementally
+            assert rs.get_nondominated_set() == rs.survival.calc_nondominated_set(rs.get_historical_population())
+
+        assert len(rs.get_historical_population()) == 12
+        assert len(rs.get_population()) == 5
+        assert rs.get_nondominated_set()
+        assert rs.get_nondominated_set_async().result() == rs.get_nondominated_set()
+
+    def test_binary_tournament_select(self):
+        rs = NSGAIISearcher(get_space, objectives=[ElapsedObjective(), create_objective('nf')],
+                            population_size=4, random_state=np.random.RandomState(1234))
+        population = [_NSGAIndividual(str(i), np.array([0.1 * i, 0.1 * i]), None) for i in range(4)]
+        for rank, indi in enumerate(population):
+            indi.rank = rank
+
+        for _ in range(10):
+            p1, p2 = rs.binary_tournament_select(population)
+            assert p1 is not p2
+            assert population[3] not in (p1, p2)  # the worst individual never wins a tournament
+
 
 class TestRNSGA2:
 
@@ -166,6 +223,21 @@ class TestRNSGA2:
     #
     #     assert (scores1 == scores2).all()
 
+    def test_nondominated_set_async(self):
+        random_state = np.random.RandomState(1234)
+        rs = RNSGAIISearcher(get_space, objectives=[ElapsedObjective(), create_objective('nf')],
+                             ref_point=[0.5, 0.5], weights=[0.4, 0.6], population_size=5,
+                             random_state=random_state)
+        for _ in range(8):
+            rs.get_nondominated_set()
+            rs.update_result(rs.sample(), random_state.uniform(size=2))
+
+        # r-dominance drops the cache on update, the set is calculated in the analysis thread
+        assert rs._nondominated_set is None
+        ns = rs.get_nondominated_set_async().result(timeout=60)
+        assert ns
+        assert ns == rs.survival.calc_nondominated_set(rs.get_historical_population())
+
     def run_nsga2_training(self, recombination: str, cv: bool, objective: str):
         random_state = get_random_state()
         X_train, y_train, X_test, y_test = get_bankdata()
@@ -234,6 +306,37 @@ class TestRDominanceSurvival:
 
         assert not _dominate(d, b)
 
+    def test_dominance_matrix(self):
+        pop = self.pop
+        dominance_matrix = self.survival.calc_dominance_matrix(pop)
+        for i, p in enumerate(pop):
+            for j, q in enumerate(pop):
+                assert dominance_matrix[i, j] == self.survival.dominate(ind1=p, ind2=q, pop=pop)
+
+    def test_dominance_matrix_pareto_equivalent(self):
+        # pareto-equivalent solutions are only distinguished by the r-dominance distance
+        scores = np.array([[0.1, 0.9], [0.3, 0.3], [0.9, 0.1], [0.5, 0.6], [0.12, 0.85]])
+        pop = [_NSGAIndividual(str(i), score, None) for i, score in enumerate(scores)]
+        survival = _RDominanceSurvival(directions=['min', 'min'], random_state=get_random_state(),
+                                       ref_point=[0.3, 0.3], population_size=len(pop),
+                                       weights=np.array([0.5, 0.5]), threshold=0.3)
+        dominance_matrix = survival.calc_dominance_matrix(pop)
+        for i, p in enumerate(pop):
+            for j, q in enumerate(pop):
+                assert dominance_matrix[i, j] == survival.dominate(ind1=p, ind2=q, pop=pop)
+        assert dominance_matrix[1, 0] and dominance_matrix[1, 2]  # closest to the reference point wins
+
+    def test_cmp_operator(self):
+        a, b, c, d = self.pop
+        a.rank, b.rank, c.rank, d.rank = 0, 0, 0, 1
+        a.distance, b.distance, c.distance, d.distance = np.array([0.1, 0.2, 0.2, 0.1])  # numpy floats
+
+        cmp_operator = self.survival.cmp_operator
+        assert cmp_operator(a, b) == 1  # the smaller the distance the better
+        assert cmp_operator(b, c) == 0
+        assert cmp_operator(c, a) == -1
+        assert cmp_operator(d, a) == -1  # the smaller the rank the better
+
 
 def test_r_dominate():
     reference_point = [0.2, 0.4]
@@ -269,5 +372,42 @@ def test_r_dominate():
 
 
 
+@pytest.mark.parametrize('survival_cls, expected', [
+    (_RankAndCrowdSortSurvival, ['1', '2', '4', '0', '3']),  # the larger the distance the better
+    (_RDominanceSurvival, ['2', '4', '1', '0', '3']),  # the smaller the distance the better
+])
+def test_sort_population(survival_cls, expected):
+    from functools import cmp_to_key
+
+    ranks = [1, 0, 0, 1, 0]
+    distances = [0.5, np.inf, 0.2, 0.5, 0.2]  # ties in both rank and distance keep their order
+    pop = [_NSGAIndividual(str(i), np.array([0.1, 0.1]), None) for i in range(len(ranks))]
+    for indi, rank, distance in zip(pop, ranks, distances):
+        indi.rank, indi.distance = rank, distance
+
+    if survival_cls is _RDominanceSurvival:
+        survival = survival_cls(directions=['min', 'min'], population_size=3, random_state=get_random_state(),
+                                ref_point=[0.1, 0.1], weights=[0.5, 0.5], threshold=0.3)
+    else:
+        survival = survival_cls(directions=['min', 'min'], population_size=3, random_state=get_random_state())
+
+    sorted_pop = survival.sort_population(pop)
+    assert [indi.dna for indi in sorted_pop] == expected
+    # same order as cmp_operator, which returns 1 if the first one is better
+    assert sorted_pop == sorted(pop, key=cmp_to_key(survival.cmp_operator), reverse=True)
+
+
+def test_update_order():
+    scores = [[0, 1], [1, 0], [0.5, 0.5], [0.6, 0.6], [2, 2]]
+    pop = [_NSGAIndividual(str(i), np.array(score), None) for i, score in enumerate(scores)]
+    survival = _RankAndCrowdSortSurvival(directions=['min', 'min'], population_size=3,
+                                         random_state=get_random_state())
+
+    # the first front survives, the boundary points are ahead for their infinite crowding distance
+    updated = survival.update(pop[:2], pop[2:])
+    assert [indi.dna for indi in updated] == ['0', '1', '2']
+    assert [indi.rank for indi in updated] == [0, 0, 0]
+
+
 # if __name__ == '__main__':
 #     Test_RNGGA2().reproce_nsga2_training()
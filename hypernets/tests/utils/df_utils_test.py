@@ -1,14 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from hypernets.utils import df_utils
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
+import pandas as pd
 
 from hypernets.experiment import CompeteExperiment, Experiment
-from hypernets.tabular import get_tool_box
 from hypernets.tabular.datasets import dsutils
 from hypernets.tests.model.plain_model_test import create_plain_model
 from hypernets.tests.tabular.tb_dask import if_dask_ready, is_dask_installed, setup_dask
 
 
+@lru_cache(maxsize=None)
+def _load_dataset(loader):
+    # read the csv once, callers get a copy
+    return loader()
+
+
+@lru_cache(maxsize=4)
+def _get_model(with_encoder):
+    # shared by the tests, which only read the data character and never fit it
+    return create_plain_model(with_encoder=with_encoder)
+
+
+def _three_way_split(X, y, sizes=(0.49, 0.21, 0.30), seed=9527):
+    """
+    Split X and y into train, eval and test parts with one shuffle.
+    """
+    if isinstance(X, pd.DataFrame):
+        idx = np.random.default_rng(seed).permutation(len(X))
+        bounds = (np.cumsum(sizes[:-1]) * len(X)).astype('int')
+        parts = [(X.iloc[i], y.iloc[i]) for i in np.split(idx, bounds)]
+    else:
+        df = X.assign(**{y.name: y})
+        parts = [(p.drop(columns=y.name), p[y.name]) for p in df.random_split(list(sizes), random_state=seed)]
+
+    (X_train, y_train), (X_eval, y_eval), (X_test, y_test) = parts
+    return X_train, X_eval, X_test, y_train, y_eval, y_test
+
+
 def test_as_array():
     pd_df = dsutils.load_bank()
     pd_series = pd_df['id']
@@ -38,31 +68,32 @@ class Test_Get_character:
     def setup_class(cls):
         if is_dask_installed:
             import dask.dataframe as dd
+            from dask.distributed import wait
             setup_dask(cls)
 
-            cls.boston = dd.from_pandas(dsutils.load_boston(), npartitions=1)
-            cls.blood = dd.from_pandas(dsutils.load_blood(), npartitions=1)
-            cls.bike_sharing = dd.from_pandas(dsutils.load_Bike_Sharing(), npartitions=1)
+            loaders = [dsutils.load_boston, dsutils.load_blood, dsutils.load_Bike_Sharing]
+            with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+                dfs = list(executor.map(_load_dataset, loaders))
+
+            # the datasets are tiny, keep them in the workers' memory once instead of scheduling from_pandas per test
+            cls.boston, cls.blood, cls.bike_sharing = \
+                [dd.from_pandas(df.copy(), npartitions=1).persist() for df in dfs]
+            wait([cls.boston, cls.blood, cls.bike_sharing])
 
     # A test for multiclass task
     def experiment_with_bike_sharing(self, init_kwargs, run_kwargs, row_count=3000, with_dask=False):
         if with_dask:
-            X = self.bike_sharing.copy()
-            y = X.pop('count')
-            y = y.astype('str')
+            X = self.bike_sharing.drop(columns=['count'])
+            y = self.bike_sharing['count'].astype('str')
         else:
-            X = dsutils.load_Bike_Sharing()
+            X = _load_dataset(dsutils.load_Bike_Sharing).copy()
             if row_count is not None:
                 X = X.head(row_count)
-            X['count'] = LabelEncoder().fit_transform(X['count'])
+            X['count'] = pd.factorize(X['count'], sort=True)[0]
             y = X.pop('count')
 
-        hyper_model = create_plain_model(with_encoder=True)
-        tb = get_tool_box(X, y)
-        X_train, X_test, y_train, y_test = \
-            tb.train_test_split(X, y, test_size=0.3, random_state=9527)
-        X_train, X_eval, y_train, y_eval = \
-            tb.train_test_split(X_train, y_train, test_size=0.3, random_state=9527)
+        hyper_model = _get_model(True)
+        X_train, X_eval, X_test, y_train, y_eval, y_test = _three_way_split(X, y)
 
         init_kwargs = {
             'X_eval': X_eval, 'y_eval': y_eval, 'X_test': X_test,
@@ -98,22 +129,18 @@ class Test_Get_character:
     # A test for binary task
     def experiment_with_blood(self, init_kwargs, run_kwargs, row_count=3000, with_dask=False):
         if with_dask:
-            X = self.blood.copy()
-            y = X.pop('Class')
+            X = self.blood.drop(columns=['Class'])
+            y = self.blood['Class']
         else:
-            X = dsutils.load_blood()
+            X = _load_dataset(dsutils.load_blood).copy()
             if row_count is not None:
                 X = X.head(row_count)
-            X['Class'] = LabelEncoder().fit_transform(X['Class'])
+            X['Class'] = pd.factorize(X['Class'], sort=True)[0]
             y = X.pop('Class')
 
-        hyper_model = create_plain_model(with_encoder=True)
+        hyper_model = _get_model(True)
 
-        tb = get_tool_box(X, y)
-        X_train, X_test, y_train, y_test = \
-            tb.train_test_split(X, y, test_size=0.3, random_state=9527)
-        X_train, X_eval, y_train, y_eval = \
-            tb.train_test_split(X_train, y_train, test_size=0.3, random_state=9527)
+        X_train, X_eval, X_test, y_train, y_eval, y_test = _three_way_split(X, y)
 
         init_kwargs = {
             'X_eval': X_eval, 'y_eval': y_eval, 'X_test': X_test,
@@ -149,23 +176,19 @@ class Test_Get_character:
     # A test for regression task
     def experiment_with_boston(self, init_kwargs, run_kwargs, row_count=3000, with_dask=False):
         if with_dask:
-            X = self.boston
-            y = X.pop('target')
+            X = self.boston.drop(columns=['target'])
+            y = self.boston['target']
         else:
-            X = dsutils.load_boston()
+            X = _load_dataset(dsutils.load_boston).copy()
             if row_count is not None:
                 X = X.head(row_count)
-            X['target'] = LabelEncoder().fit_transform(X['target'])
+            X['target'] = pd.factorize(X['target'], sort=True)[0]
             y = X.pop('target')
             y = y.astype('float64')
 
-        hyper_model = create_plain_model(with_encoder=True)
+        hyper_model = _get_model(True)
 
-        tb = get_tool_box(X, y)
-        X_train, X_test, y_train, y_test = \
-            tb.train_test_split(X, y, test_size=0.3, random_state=9527)
-        X_train, X_eval, y_train, y_eval = \
-            tb.train_test_split(X_train, y_train, test_size=0.3, random_state=9527)
+        X_train, X_eval, X_test, y_train, y_eval, y_test = _three_way_split(X, y)
 
         init_kwargs = {
             'X_eval': X_eval, 'y_eval': y_eval, 'X_test': X_test,
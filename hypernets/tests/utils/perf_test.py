@@ -1,9 +1,16 @@
 import os
+import signal
+import subprocess
+import sys
+import time
 from collections import OrderedDict
 
+import numpy as np
+import pandas as pd
 import psutil
+import pytest
 
-from hypernets.utils import get_perf
+from hypernets.utils import get_perf, load_perf, summarize_perf, is_os_windows, _perf
 
 
 def test_get_perf():
@@ -11,3 +18,64 @@ def test_get_perf():
     perf = get_perf(proc)
     assert isinstance(perf, OrderedDict)
     assert 'cpu_total' in perf.keys()
+
+
+@pytest.mark.skipif(_perf._cpu_sampler is None, reason='/proc is not available')
+def test_fast_cpu_sampler():
+    sampler = _perf._FastCpuSampler()
+    pid = os.getpid()
+    assert sampler.proc_cpu_percent(pid) == 0.0
+
+    sum(range(1000000))
+    assert 0.0 <= sampler.cpu_percent() <= 100.0
+    assert sampler.proc_cpu_percent(pid) >= 0.0
+
+    # a reused pid is not compared with the dead process, and processes not sampled are forgotten
+    starttime, _ = sampler._read_proc(pid)
+    sampler._last_procs[(pid, starttime - 1)] = (0.0, 0.0)
+    sampler.proc_cpu_percent(pid)
+    sampler.end_sample()
+    assert list(sampler._last_procs.keys()) == [(pid, starttime)]
+    sampler.end_sample()
+    assert not sampler._last_procs
+
+
+def test_summarize_perf():
+    df = pd.DataFrame({'timestamp': pd.date_range('2024-01-01', periods=100, freq='s'),
+                       'cpu_used': np.arange(100, dtype='float'),
+                       'mem_used': np.arange(100),
+                       'gpu_0_used': np.nan})
+    summary = summarize_perf(df)
+
+    assert summary.columns.to_list() == ['cpu_used', 'mem_used', 'gpu_0_used']
+    assert summary.index.to_list() == ['min', 'max', 'mean', 'p95']
+    assert np.allclose(summary['cpu_used'], [0, 99, 49.5, df['cpu_used'].quantile(0.95)])
+    assert summary['gpu_0_used'].isna().all()
+
+
+def test_dump_and_load_perf(tmp_path):
+    file_path = (tmp_path / 'perf.csv').as_posix()
+    code = f'from hypernets.utils import dump_perf; dump_perf({file_path!r}, pid={os.getpid()}, recursive=True, ' \
+           f'interval=0.1, flush_every=1)'
+    proc = subprocess.Popen([sys.executable, '-c', code])
+    try:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if os.path.exists(file_path) and len(open(file_path).readlines()) > 3:
+                break
+            time.sleep(0.1)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    if not is_os_windows:
+        assert proc.returncode == -signal.SIGTERM  # killed by the signal even though rows are drained
+
+    with open(file_path) as f:
+        header = f.readline().strip().split(',')
+    df = load_perf(file_path)
+
+    assert len(df) >= 3
+    assert df.columns.to_list() == header[:1] + ['elapsed'] + header[1:]
+    assert pd.api.types.is_datetime64_any_dtype(df['timestamp'])
+    assert all(pd.api.types.is_numeric_dtype(df[c]) for c in df.columns[1:])
+    assert (df['proc_count'] >= 1).all()
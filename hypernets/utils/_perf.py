@@ -2,10 +2,16 @@
 """
 
 """
+import atexit
+import csv
+import os
+import platform
+import signal
+import threading
 import time
-from _datetime import datetime
 from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 import psutil
 
@@ -22,128 +28,294 @@ except:
     pynvml_installed = False
 
 _gpu_devices = []
+_pynvml_initialized = False
+_pynvml_lock = threading.Lock()
 
 
-def _initialize_pynvml():
-    global _gpu_devices, pynvml_installed
+def _init_once():
+    global _gpu_devices, pynvml_installed, _pynvml_initialized
 
-    if pynvml_installed and pynvml.nvmlLib is None:
+    if _pynvml_initialized:
+        return
+
+    with _pynvml_lock:
+        if _pynvml_initialized:
+            return
+
+        if pynvml_installed:
+            try:
+                pynvml.nvmlInit()
+
+                _gpu_devices = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+            except Exception as e:
+                print('nvmlInit Error:', e)
+                pynvml_installed = False
+                _gpu_devices = []
+
+        _pynvml_initialized = True
+
+
+class _FastCpuSampler:
+    """
+    cpu_percent from /proc/stat and /proc/<pid>/stat directly, same as psutil does but without its bookkeeping.
+    The percentages are computed against the previous call, the first call of a process returns 0.0 like psutil.
+    """
+
+    def __init__(self):
+        self._clk_tck = os.sysconf('SC_CLK_TCK')
+        self._last_cpu = self._read_cpu()
+        self._last_procs = {}
+        self._seen_procs = set()
+
+    @staticmethod
+    def _read_cpu():
+        with open('/proc/stat', 'rb') as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+        # guest and guest_nice are counted in user and nice already
+        total = sum(fields[:8])
+        idle = fields[3] + fields[4]
+        return total - idle, total
+
+    def _read_proc(self, pid):
         try:
-            pynvml.nvmlInit()
+            with open(f'/proc/{pid}/stat', 'rb') as f:
+                line = f.read()
+        except FileNotFoundError:
+            raise psutil.NoSuchProcess(pid)
+        # the process name may contain spaces, so split after it, fields start from the 3rd one then
+        fields = line[line.rindex(b')') + 2:].split()
+        # starttime tells a reused pid from the dead process
+        return int(fields[19]), (int(fields[11]) + int(fields[12])) / self._clk_tck
 
-            _gpu_devices = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
-        except Exception as e:
-            print('nvmlInit Error:', e)
-            pynvml_installed = False
-            _gpu_devices = []
+    def cpu_percent(self):
+        busy, total = self._read_cpu()
+        last_busy, last_total = self._last_cpu
+        self._last_cpu = (busy, total)
 
+        if total <= last_total:
+            return 0.0
+        return round(min(max((busy - last_busy) / (total - last_total) * 100, 0.0), 100.0), 1)
 
-def get_perf(proc=None, recursive=True, children_pool=None, metrics=None):
+    def proc_cpu_percent(self, pid):
+        starttime, used = self._read_proc(pid)
+        now = time.monotonic()
+        key = (pid, starttime)
+        last = self._last_procs.get(key)
+        self._last_procs[key] = (used, now)
+        self._seen_procs.add(key)
+
+        if last is None or now <= last[1] or used < last[0]:
+            return 0.0
+        return round((used - last[0]) / (now - last[1]) * 100, 1)
+
+    def end_sample(self):
+        """
+        Forget the processes not sampled since the last call, such as the exited children and the dead owner of a
+        reused pid.
+        """
+        self._last_procs = {k: v for k, v in self._last_procs.items() if k in self._seen_procs}
+        self._seen_procs = set()
+
+
+def _create_cpu_sampler():
+    if platform.system() != 'Linux':
+        return None
+    try:
+        return _FastCpuSampler()
+    except Exception:
+        return None
+
+
+_cpu_sampler = _create_cpu_sampler()
+
+
+def _cpu_percent():
+    return _cpu_sampler.cpu_percent() if _cpu_sampler is not None else psutil.cpu_percent()
+
+
+def _proc_cpu_percent(p):
+    return _cpu_sampler.proc_cpu_percent(p.pid) if _cpu_sampler is not None else p.cpu_percent()
+
+
+_last_timestamp = (None, None)
+
+
+def _timestamp():
     """
-    Get process performance metrics
+    Current time formatted to seconds, formatting once per second only.
     """
-    _initialize_pynvml()
+    global _last_timestamp
 
-    if metrics is None:
-        metrics = OrderedDict()
+    now = int(time.time())
+    seconds, formatted = _last_timestamp
+    if now != seconds:
+        formatted = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+        _last_timestamp = (now, formatted)
+    return formatted
+
+
+_GPU_METRICS = ('used', 'mem_used', 'mem_total', 'power_used', 'power_total')
+
+
+def _perf_columns(proc, recursive):
+    """
+    Metric names of the values sampled by _sample_perf, in the same order.
+    """
+    columns = ['timestamp', 'cpu_total', 'cpu_used']
+    if proc:
+        columns += ['proc_count', 'cpu_used_proc'] if recursive else ['cpu_used_proc']
+    columns += ['mem_total', 'mem_used']
+    if proc:
+        columns.append('mem_used_proc')
+    for i in range(len(_gpu_devices)):
+        columns += [f'gpu_{i}_{m}' for m in _GPU_METRICS]
 
-    metrics['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
-    metrics['cpu_total'] = psutil.cpu_count()
-    metrics['cpu_used'] = psutil.cpu_percent()
+    return columns
+
+
+def _sample_perf(proc, recursive, children_pool):
+    """
+    Sample the metrics as a list of values, see _perf_columns for their names.
+    """
+    procs = _proc_tree(proc, children_pool) if proc and recursive else None
+
+    values = [_timestamp(), psutil.cpu_count(), _cpu_percent()]
     if proc:
         if recursive:
-            percents = []
-            _recursive_proc(percents, proc, children_pool, lambda p: p.cpu_percent())
-            metrics['proc_count'] = len(percents)
-            metrics['cpu_used_proc'] = sum(percents)
+            percents = _collect_procs(procs, _proc_cpu_percent)
+            if _cpu_sampler is not None:
+                _cpu_sampler.end_sample()
+            values.append(len(percents))
+            values.append(sum(percents))
         else:
-            metrics['cpu_used_proc'] = proc.cpu_percent()
+            values.append(_proc_cpu_percent(proc))
 
     mem = psutil.virtual_memory()
-    metrics['mem_total'] = mem.total
-    metrics['mem_used'] = mem.used
+    values.append(mem.total)
+    values.append(mem.used)
     if proc:
         if recursive:
-            rss = []
-            _recursive_proc(rss, proc, children_pool, lambda p: p.memory_info().rss)
-            metrics['mem_used_proc'] = sum(rss)
+            values.append(sum(_collect_procs(procs, lambda p: p.memory_info().rss)))
         else:
-            metrics['mem_used_proc'] = proc.memory_info().rss
-    try:
-        for i, h in enumerate(_gpu_devices):
-            used = pynvml.nvmlDeviceGetUtilizationRates(h)
-            mem = pynvml.nvmlDeviceGetMemoryInfo(h)
-            metrics[f'gpu_{i}_used'] = used.gpu
-            metrics[f'gpu_{i}_mem_used'] = mem.used  # used.memory
-            metrics[f'gpu_{i}_mem_total'] = mem.total
-            metrics[f'gpu_{i}_power_used'] = pynvml.nvmlDeviceGetPowerUsage(h)
-            metrics[f'gpu_{i}_power_total'] = pynvml.nvmlDeviceGetPowerManagementLimit(h)
-    except:
-        pass
+            values.append(proc.memory_info().rss)
+    if _gpu_devices:
+        _util = pynvml.nvmlDeviceGetUtilizationRates
+        _mem = pynvml.nvmlDeviceGetMemoryInfo
+        _pw = pynvml.nvmlDeviceGetPowerUsage
+        _pwlim = pynvml.nvmlDeviceGetPowerManagementLimit
+        for h in _gpu_devices:
+            try:
+                used = _util(h)
+                mem = _mem(h)
+                values += [used.gpu, mem.used, mem.total, _pw(h), _pwlim(h)]  # mem.used rather than used.memory
+            except:
+                values += [None] * len(_GPU_METRICS)
+
+    return values
+
+
+def get_perf(proc=None, recursive=True, children_pool=None, metrics=None):
+    """
+    Get process performance metrics
+    """
+    _init_once()
+
+    if metrics is None:
+        metrics = OrderedDict()
+
+    values = _sample_perf(proc, recursive, children_pool)
+    metrics.update(zip(_perf_columns(proc, recursive), values))
 
     return metrics
 
 
-def _recursive_proc(result_buf, proc_, children_pool, fn):
+def _proc_tree(proc, children_pool):
+    """
+    The process and all its descendants, walked once per sample.
+    Children are reused from children_pool so that cpu_percent compares with the previous call.
+    """
     assert children_pool is None or isinstance(children_pool, dict)
 
-    try:
-        result_buf.append(fn(proc_))
-
-        for c in proc_.children(recursive=True):
-            # _recursive_proc(result_buf, c, fn)
-            if children_pool is None:
-                p = c
-            else:
-                cpid = c.pid
-                if cpid in children_pool.keys():
-                    p = children_pool[cpid]
-                else:
-                    children_pool[cpid] = c
-                    p = c
+    procs = [proc]
+    for c in proc.children(recursive=True):  # NoSuchProcess of proc is raised to the caller
+        if children_pool is not None:
+            c = children_pool.setdefault(c.pid, c)
+        procs.append(c)
 
-            try:
-                result_buf.append(fn(p))
-            except KeyboardInterrupt:
-                raise
-            except InterruptedError:
+    return procs
+
+
+def _collect_procs(procs, fn):
+    result = []
+    for i, p in enumerate(procs):
+        try:
+            result.append(fn(p))
+        except KeyboardInterrupt:
+            raise
+        except InterruptedError:
+            raise
+        except psutil.NoSuchProcess:
+            if i == 0:
                 raise
-            except psutil.NoSuchProcess:
-                pass
-            except:
-                import traceback
-                traceback.print_exc()
-                pass
-    except KeyboardInterrupt:
-        raise
-    except InterruptedError:
-        raise
-    except psutil.NoSuchProcess:
-        raise
-    except:
-        import traceback
-        traceback.print_exc()
-        pass
+        except:
+            import traceback
+            traceback.print_exc()
+
+    return result
+
 
+class _Terminated(BaseException):
+    pass
 
-def dump_perf(file_path, pid=None, recursive=False, interval=1):
+
+def dump_perf(file_path, pid=None, recursive=False, interval=1, flush_every=10):
     """
-    Dump process performance metrics data into a csv file
+    Dump process performance metrics data into a csv file,
+    rows are buffered and written every `flush_every` samples.
     """
     children_pool = {} if recursive else None
-    metrics = OrderedDict()
     proc = psutil.Process(pid) if pid else None
-    header = True
+    buf = []
+
+    def drain():
+        if buf and not f.closed:
+            writer.writerows(buf)
+            f.flush()
+            buf.clear()
+
+    def on_sigterm(signum, frame):
+        raise _Terminated()  # drained by the finally clause, then signaled again
+
+    prev_sigterm = None
     try:
-        with open(file_path, 'w') as f:
-            while True:
-                get_perf(proc, recursive=recursive, children_pool=children_pool, metrics=metrics)
-                if header:
-                    header = False
-                    f.write(','.join(metrics.keys()) + '\n')
-                f.write(','.join(map(str, metrics.values())) + '\n')
-                f.flush()
-                time.sleep(interval)
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            atexit.register(drain)
+            if threading.current_thread() is threading.main_thread():
+                prev_sigterm = signal.signal(signal.SIGTERM, on_sigterm)
+            try:
+                _init_once()
+                writer.writerow(_perf_columns(proc, recursive))
+                next_t = time.monotonic()
+                while True:
+                    buf.append(_sample_perf(proc, recursive, children_pool))
+                    if len(buf) >= flush_every:
+                        drain()
+                    # sleep to the next deadline so that the sampling time does not drift the interval
+                    next_t += interval
+                    delay = next_t - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_t = time.monotonic()  # overrun, skip the missed samples
+            finally:
+                drain()
+                atexit.unregister(drain)
+                if prev_sigterm is not None:
+                    signal.signal(signal.SIGTERM, prev_sigterm)
+    except _Terminated:
+        # the previous handler is restored, terminate as if dump_perf never handled the signal
+        os.kill(os.getpid(), signal.SIGTERM)
     except KeyboardInterrupt:
         # print('KeyboardInterrupt')
         pass
@@ -159,12 +331,21 @@ def dump_perf(file_path, pid=None, recursive=False, interval=1):
         pass
 
 
+def _read_perf_csv(file_path):
+    try:
+        # multithreaded parsing if pyarrow is installed
+        return pd.read_csv(file_path, engine='pyarrow', parse_dates=['timestamp'])
+    except (ImportError, ValueError):
+        return pd.read_csv(file_path)
+
+
 def load_perf(file_path, human_readable=True):
-    df = pd.read_csv(file_path)
+    df = _read_perf_csv(file_path)
     columns = df.columns.to_list()
     assert 'timestamp' in columns
 
-    df['timestamp'] = df['timestamp'].apply(lambda t: datetime.strptime(t, '%Y-%m-%d %H:%M:%S'))
+    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='%Y-%m-%d %H:%M:%S', cache=True)
     start_at = df['timestamp'].min()
     delta = pd.Timedelta(1, 'S')
     df.insert(1, 'elapsed', (df['timestamp'] - start_at) // delta)
@@ -173,13 +354,66 @@ def load_perf(file_path, human_readable=True):
         GB = 1024 ** 3
         if 'cpu_used_proc' in columns:
             df['cpu_used_proc'] = df['cpu_used_proc'] / df['cpu_total']
-        for c in columns:
-            if c.startswith('mem_'):
-                df[c] = df[c] / GB
-            if c.startswith('gpu_'):
-                if c.find('_power_') > 0:
-                    df[c] = df[c] / 1000
-                elif c.find('_mem_') > 0:
-                    df[c] = df[c] / GB
+
+        power_cols = [c for c in columns if c.startswith('gpu_') and c.find('_power_') > 0]
+        mem_cols = [c for c in columns
+                    if c.startswith('mem_') or (c.startswith('gpu_') and c not in power_cols and c.find('_mem_') > 0)]
+        if mem_cols:
+            df[mem_cols] = df[mem_cols] / GB
+        if power_cols:
+            df[power_cols] = df[power_cols] / 1000
 
     return df
+
+
+def _colstats_numpy(arr):
+    # arr in shape (n_columns, n_rows)
+    return (np.nanmin(arr, axis=1), np.nanmax(arr, axis=1), np.nanmean(arr, axis=1),
+            np.nanpercentile(arr, 95, axis=1))
+
+
+def _colstats_loop(arr):
+    n = arr.shape[0]
+    mins = np.empty(n)
+    maxs = np.empty(n)
+    means = np.empty(n)
+    p95s = np.empty(n)
+    for i in range(n):
+        col = arr[i]
+        mins[i] = np.nanmin(col)
+        maxs[i] = np.nanmax(col)
+        means[i] = np.nanmean(col)
+        p95s[i] = np.nanpercentile(col, 95)
+    return mins, maxs, means, p95s
+
+
+_colstats = None
+
+
+def _get_colstats():
+    # numba is imported on the first summary only, it is slow to import
+    global _colstats
+
+    if _colstats is None:
+        try:
+            from numba import njit
+            _colstats = njit(cache=True)(_colstats_loop)
+        except ImportError:
+            _colstats = _colstats_numpy
+    return _colstats
+
+
+def summarize_perf(df):
+    """
+    Summarize the numeric columns of the DataFrame returned by load_perf,
+    the result has index ['min', 'max', 'mean', 'p95'] and one column for each metric.
+    """
+    df = df.select_dtypes('number')
+    arr = np.ascontiguousarray(df.to_numpy(dtype=np.float64).T)
+
+    if len(df) == 0:
+        stats = [np.full(arr.shape[0], np.nan)] * 4
+    else:
+        stats = _get_colstats()(arr)
+
+    return pd.DataFrame(np.vstack(stats), index=['min', 'max', 'mean', 'p95'], columns=df.columns)